@@ -0,0 +1,45 @@
+"""
+Embedding Build Module
+======================
+
+This module embeds the prompting principles once and saves the vector next to
+`text_definitions.py`, where it is available as `prompting_principles_embedding`.
+
+Semantic caches can seed their index with the saved vector instead of embedding the principles
+when they start. The file name contains the digest of the principles, so a vector of an older
+text is never loaded.
+
+It requires `numpy` and `sentence-transformers`, which the app itself does not need.
+
+Functions:
+    build_embedding: Embeds the principles and saves the vector.
+"""
+import sys
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+import text_definitions
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def build_embedding(model_name=MODEL_NAME):
+    """
+    Embeds the principles and saves the vector.
+
+    Args:
+        model_name (str): The name of the sentence-transformers model.
+
+    Returns:
+        str: The path of the saved vector.
+    """
+    model = SentenceTransformer(model_name)
+    vector = model.encode(text_definitions.prompting_principles, normalize_embeddings=True)
+    path = text_definitions.embedding_path()
+    np.save(path, vector.astype(np.float32))
+    return path
+
+
+if __name__ == "__main__":
+    print(build_embedding(*sys.argv[1:]))
@@ -0,0 +1,3 @@
+"""
+Makes the modules of the repository root importable by the tests.
+"""
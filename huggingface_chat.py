@@ -8,16 +8,48 @@ via the HugChat API.
 Classes:
     HuggingChatWrapper: A wrapper class to manage Hugging Face chat models and interactions.
 
+Functions:
+    get_cookies: Returns the cached Hugging Face cookies for an account.
+
 """
 
+import asyncio
+from functools import cached_property
 import streamlit as st
 from hugchat import hugchat
 from hugchat.login import Login
 
+# Maximum number of chat queries sent to the server at the same time by chat_many
+MAX_CONCURRENT_CHATS = 10
+
+
+@st.cache_resource(ttl=3600)
+def get_cookies(email, password, cookie_path_dir):
+    """
+    Returns the Hugging Face cookies for the given account.
+
+    `Login.login` reuses the cookies saved in the cookie directory if they are valid, otherwise
+    it logs in and saves the new cookies. The result is cached for an hour.
+
+    Args:
+        email (str): The email used to log in to Hugging Face.
+        password (str): The password used to log in to Hugging Face.
+        cookie_path_dir (str): The directory path to load and save cookies.
+
+    Returns:
+        RequestsCookieJar: The cookies of the logged in account.
+    """
+    sign = Login(email, password)
+    return sign.login(cookie_dir_path=cookie_path_dir, save_cookies=True)
+
+
 class HuggingChatWrapper:
     """
     A wrapper class to manage Hugging Face chat models and interactions.
 
+    The login, the ChatBot and the model list are created on first use, so an instance
+    that is never used to chat costs no network round-trip.
+
     Attributes:
         email (str): The email used to log in to Hugging Face.
         password (str): The password used to log in to Hugging Face.
@@ -31,8 +63,12 @@ class HuggingChatWrapper:
         get_available_models(): Returns the names of available language models.
         switch_model(model_name): Switches the current model to the specified one.
         chat(query, web_search): Executes a chat query and returns the response.
-        reset(): Resets the conversation history.
-        delete_all(): Deletes all conversations.
+        stream_tokens(query_result): Yields the tokens of a response while it is generated.
+        complete(query, web_search): Executes a chat query in a new conversation and waits for its text.
+        achat(query, web_search, semaphore): Executes a chat query without blocking the event loop.
+        chat_many(queries): Executes several chat queries concurrently and deletes their conversations.
+        reset(): Deletes the conversations of this wrapper.
+        delete_all(): Deletes all conversations of the account.
     """
     
     def __init__(self):
@@ -48,16 +84,59 @@ class HuggingChatWrapper:
         else:
             self.password = st.secrets.get("HF_PWD")
 
-        # Log in to Hugging Face and grant authorization to Hugging Chat
+        # Login, ChatBot and models are created lazily on first access
         self.cookie_path_dir = "./cookies/"
-        sign = Login(self.email, self.password)
-        self.cookies = sign.login(cookie_dir_path=self.cookie_path_dir, save_cookies=True)
-        
-        # Create ChatBot
-        self.chatbot = hugchat.ChatBot(cookies=self.cookies.get_dict())       
-        self.models = self.chatbot.get_available_llm_models()
-        self.model_names = [model.name for model in self.models]
-        self.reset()
+        self._current_model_name = None
+
+    @cached_property
+    def cookies(self):
+        """
+        Logs in to Hugging Face and grants authorization to Hugging Chat.
+
+        Returns:
+            RequestsCookieJar: The cookies obtained after logging in.
+        """
+        return get_cookies(self.email, self.password, self.cookie_path_dir)
+
+    @cached_property
+    def chatbot(self):
+        """
+        Creates the ChatBot.
+
+        Returns:
+            hugchat.ChatBot: An instance of the HugChat ChatBot.
+        """
+        return hugchat.ChatBot(cookies=self.cookies.get_dict())
+
+    @cached_property
+    def models(self):
+        """
+        Fetches the available language models.
+
+        Returns:
+            list: A list of available language models.
+        """
+        return self.chatbot.get_available_llm_models()
+
+    @cached_property
+    def _model_index(self):
+        """
+        Maps the model names to their index in the model list.
+
+        Returns:
+            dict: A dictionary with model names as keys and model indexes as values.
+        """
+        return {model.name: idx for idx, model in enumerate(self.models)}
+
+    @cached_property
+    def model_names(self):
+        """
+        Returns the names of the available language models.
+
+        Returns:
+            list: A list of names of available language models.
+        """
+        return list(self._model_index)
 
     def get_available_models(self):
         """
@@ -74,11 +153,19 @@ class HuggingChatWrapper:
 
         Args:
             model_name (str): The name of the model to switch to.
+
+        Does nothing if a conversation with this model is already active.
+
+        Raises:
+            ValueError: If no model name is given.
+            KeyError: If no model with the given name is available.
         """
-        for idx, model in enumerate(self.models):
-            if model.name == model_name:
-                model_index = idx
-        self.chatbot.new_conversation(modelIndex = model_index, switch_to = True)        
+        if model_name is None:
+            raise ValueError("No model selected, the model list could not be loaded.")
+        if model_name == self._current_model_name:
+            return
+        self.chatbot.new_conversation(modelIndex = self._model_index[model_name], switch_to = True)
+        self._current_model_name = model_name
 
     def chat(self, query, web_search):
         """
@@ -93,17 +180,111 @@ class HuggingChatWrapper:
         """
         query_result = self.chatbot.chat(query, web_search=web_search)
         return query_result
+
+    @staticmethod
+    def stream_tokens(query_result):
+        """
+        Yields the text of a chat response token by token while it is generated.
+
+        Args:
+            query_result (Message): The response returned by chat.
+
+        Yields:
+            str: The next token of the response.
+        """
+        for chunk in query_result:
+            if chunk and chunk.get("type") == "stream":
+                yield chunk["token"]
+
+    def complete(self, query, web_search):
+        """
+        Executes a chat query in a new conversation with the current model and waits for its text.
+
+        The response of `chat` is generated lazily while it is read, so it is read to the end
+        here. Each query gets its own conversation, so concurrent queries do not share a history.
+
+        Args:
+            query (str): The chat query.
+            web_search (bool): Whether to use web search in the chat query.
+
+        Returns:
+            str: The text of the response.
+        """
+        model_index = None
+        if self._current_model_name is not None:
+            model_index = self._model_index[self._current_model_name]
+        conversation = self.chatbot.new_conversation(modelIndex=model_index)
+        query_result = self.chatbot.chat(query, web_search=web_search, conversation=conversation)
+        return query_result.wait_until_done()
+
+    async def achat(self, query, web_search, semaphore=None):
+        """
+        Executes a chat query in a worker thread and returns the text of the response.
+
+        The request and the whole response run in the worker thread, see `complete`.
+
+        Args:
+            query (str): The chat query.
+            web_search (bool): Whether to use web search in the chat query.
+            semaphore (asyncio.Semaphore): Optional semaphore bounding the concurrent queries.
+
+        Returns:
+            str: The text of the response.
+        """
+        if semaphore is None:
+            return await asyncio.to_thread(self.complete, query, web_search)
+        async with semaphore:
+            return await asyncio.to_thread(self.complete, query, web_search)
+
+    def chat_many(self, queries):
+        """
+        Executes several chat queries concurrently and returns their responses.
+
+        The conversations of the queries are deleted afterwards, also if a query fails.
+
+        Args:
+            queries (list): A list of (query, web_search) tuples.
+
+        Returns:
+            list: The texts of the responses in the order of the queries.
+        """
+        # Log in and create the ChatBot before the worker threads would race to do it
+        chatbot = self.chatbot
+        conversation_count = len(chatbot.get_conversation_list())
+
+        async def gather():
+            # The semaphore is bound to the event loop, so it is created inside it
+            semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHATS)
+            return await asyncio.gather(
+                *[self.achat(query, web_search, semaphore) for query, web_search in queries]
+            )
+
+        try:
+            return asyncio.run(gather())
+        finally:
+            # asyncio.run waits for the worker threads, the conversations they created are
+            # appended to the list. hugchat deletes a conversation by popping its index from
+            # that list, which is not thread-safe, so they are deleted here one by one.
+            for conversation in chatbot.get_conversation_list()[conversation_count:]:
+                chatbot.delete_conversation(conversation)
     
     def reset(self):
         """
         Resets the conversation history.
+
+        Only the conversations of this wrapper's ChatBot are deleted, so other sessions of the
+        same account keep theirs.
         """
-        conversations = self.chatbot.get_conversation_list()
-        for conversation in conversations:
-            self.chatbot.delete_conversation(conversation)                    
-        
+        for conversation in self.chatbot.get_conversation_list():
+            self.chatbot.delete_conversation(conversation)
+        # There is no active conversation left to chat with
+        self._current_model_name = None
+
+
     def delete_all(self):
         """
-        Deletes all conversations.
+        Deletes all conversations of the account, including those of other sessions.
         """
         self.chatbot.delete_all_conversations()
+        # There is no active conversation left to chat with
+        self._current_model_name = None
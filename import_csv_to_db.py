@@ -0,0 +1,107 @@
+"""
+CSV Import Module
+=================
+
+This module imports role prompts from a CSV file (columns `act` and `prompt`, as in the
+awesome-chatgpt-prompts collection) into the `prompt_templates` table.
+
+The rows are inserted in bulk with `DataFrame.to_sql` instead of adding one ORM object per
+row, so an import issues a few multi-row INSERT statements rather than one per template.
+
+Functions:
+    psql_insert_copy: `to_sql` insertion method that uses PostgreSQL `COPY FROM STDIN`.
+    prepare_chunk: Maps CSV rows to the columns of the `prompt_templates` table.
+    import_csv_to_db: Imports the prompts of a CSV file into the database.
+"""
+import csv
+import sys
+from io import StringIO
+
+import pandas as pd
+from prompt_template_database import get_session, PromptTemplate
+
+TOPIC = "Role Prompts"
+COLUMNS = ["topic", "name", "purpose", "template", "use_web_search"]
+CHUNKSIZE = 10000
+# SQLite limits the number of bound parameters per statement (SQLITE_MAX_VARIABLE_NUMBER)
+SQLITE_MAX_VARIABLES = 32766
+
+
+def psql_insert_copy(table, conn, keys, data_iter):
+    """
+    Inserts the data with PostgreSQL `COPY FROM STDIN`, see the pandas `to_sql` documentation.
+
+    Args:
+        table (pandas.io.sql.SQLTable): The table to insert into.
+        conn (sqlalchemy.engine.Connection): The database connection.
+        keys (list): The column names.
+        data_iter (Iterable): The rows to insert.
+    """
+    dbapi_conn = conn.connection
+    with dbapi_conn.cursor() as cur:
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows(data_iter)
+        buffer.seek(0)
+
+        columns = ", ".join(f'"{key}"' for key in keys)
+        if table.schema:
+            table_name = f"{table.schema}.{table.name}"
+        else:
+            table_name = table.name
+
+        sql = f"COPY {table_name} ({columns}) FROM STDIN WITH CSV"
+        cur.copy_expert(sql=sql, file=buffer)
+
+
+def prepare_chunk(data):
+    """
+    Maps a chunk of CSV rows to the columns of the `prompt_templates` table.
+
+    Args:
+        data (DataFrame): The CSV rows with the columns `act` and `prompt`.
+
+    Returns:
+        DataFrame: The rows with the columns of the `prompt_templates` table.
+    """
+    data = data.rename(columns={"act": "name", "prompt": "template"})
+    data["topic"] = TOPIC
+    data["purpose"] = "Tells the model to act as " + data["name"]
+    data["use_web_search"] = False
+    return data[COLUMNS]
+
+
+def import_csv_to_db(csv_file):
+    """
+    Imports the prompts of a CSV file into the database.
+
+    The file is read and committed in chunks of `CHUNKSIZE` rows, so memory use is bounded
+    by the chunk size and not by the size of the file.
+
+    Args:
+        csv_file (str): The path of the CSV file with the columns `act` and `prompt`.
+    """
+    session = get_session()
+    dialect = session.get_bind().dialect.name
+    chunksize = CHUNKSIZE
+    if dialect == "postgresql":
+        method = psql_insert_copy
+    else:
+        method = "multi"
+        if dialect == "sqlite":
+            chunksize = min(chunksize, SQLITE_MAX_VARIABLES // len(COLUMNS))
+
+    for chunk in pd.read_csv(csv_file, chunksize=CHUNKSIZE):
+        prepare_chunk(chunk).to_sql(
+            PromptTemplate.__tablename__,
+            session.connection(),
+            if_exists="append",
+            index=False,
+            method=method,
+            chunksize=chunksize,
+        )
+        session.commit()
+
+
+if __name__ == "__main__":
+    import_csv_to_db(sys.argv[1])
@@ -11,11 +11,15 @@ Key Components:
 1. **Streamlit Input Fields**: Dynamic creation of input fields for template variables.
 2. **Template Management**: Functions to retrieve, create, update, and delete templates from a database.
 3. **HuggingFace API Integration**: Use of `HuggingChatWrapper` to interact with language models hosted on HuggingFace via the HuggingChat API.
-4. **Prompt Template Handling**: Use of `ChatPromptTemplate` to format and process input data for the LLM.
+4. **Prompt Template Handling**: Templates are Python format strings, their `{variable}` placeholders are filled with `str.format_map`.
 
 Functions:
-    - `create_input_fields(variables)`: Creates Streamlit input fields for string variables.
-    - `get_templates()`: Retrieves templates by topic from the database.
+    - `create_input_fields(template)`: Creates Streamlit input fields for the variables of a template.
+    - `get_template_names(template_use)`: Retrieves the template names of the selected topic from the database.
+    - `get_selected_template(selected_template_name)`: Fetches the selected template by its id.
+    - `use_template()`: Sends a formatted template to the LLM and displays the response.
+    - `maintain_template(template_names, selected_template_name)`: Updates or deletes a template.
+    - `create_template(template_names)`: Creates a new template.
     - `main()`: Main function to run the Streamlit app.
 
 Workflow:
@@ -25,8 +29,7 @@ Workflow:
 
 Dependencies:
 - `streamlit`: For creating the web interface.
-- `langchain.prompts.ChatPromptTemplate`: For handling prompt templates.
-- `prompt_template_database.session` and `prompt_template_database.PromptTemplate`: For database interactions.
+- `prompt_template_database.get_session`, `prompt_template_database.create_session`, `prompt_template_database.remove_session` and `prompt_template_database.PromptTemplate`: For database interactions.
 - `text_definitions.prompting_principles`: For displaying prompting guidelines.
 - `huggingface_chat.HuggingChatWrapper`: For interacting with the HuggingFace LLM API.
 
@@ -36,13 +39,71 @@ Usage:
 
 """
 
+import string
 import streamlit as st
-from prompt_template_database import session, PromptTemplate
+from prompt_template_database import get_session, create_session, remove_session, PromptTemplate
 from text_definitions import prompting_principles
-from langchain.prompts import ChatPromptTemplate
 from huggingface_chat import HuggingChatWrapper
 
 
+# Parses templates into their replacement fields exactly like str.format_map does
+TEMPLATE_FORMATTER = string.Formatter()
+
+
+def iter_template_variables(template):
+    """
+    Yield the names looked up in the mapping when a template is formatted with `str.format_map`.
+
+    Attribute and index access such as `{a.b}` or `{a[0]}` look up `a`, conversions and format
+    specs such as `{x!r}` or `{x:>10}` look up `x`, and fields nested in a format spec are looked
+    up too. Positional fields such as `{}` or `{0}` cannot be filled from a mapping and are skipped.
+
+    Args:
+        template (str): The prompt template text.
+
+    Yields:
+        str: The variable names in order of appearance, possibly repeated.
+    """
+    for _, field_name, format_spec, _ in TEMPLATE_FORMATTER.parse(template):
+        if field_name is None:
+            continue
+        name = field_name.partition(".")[0].partition("[")[0]
+        if name.isidentifier():
+            yield name
+        if format_spec:
+            yield from iter_template_variables(format_spec)
+
+
+class SafeDict(dict):
+    """
+    A dictionary for `str.format_map` that leaves placeholders without a value unchanged.
+    """
+
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+
+@st.cache_resource(max_entries=256)
+def parse_template(template):
+    """
+    Find the input variables of a prompt template and cache them across reruns.
+
+    The tuple is immutable, so it is cached as a shared resource of the most recent templates
+    and a hit returns it without the copy `st.cache_data` makes.
+
+    Args:
+        template (str): The prompt template text.
+
+    Returns:
+        tuple: The distinct input variable names in order of appearance.
+    """
+    try:
+        return tuple(dict.fromkeys(iter_template_variables(template)))
+    except ValueError:
+        # Not a valid format string, e.g. a single brace, so there is nothing to fill in
+        return ()
+
+
 def create_input_fields(template):
     """
     Create Streamlit input fields for string variables.
@@ -54,9 +115,7 @@ def create_input_fields(template):
         dict: A dictionary with variable names as keys and their corresponding
               Streamlit input values.
     """
-    prompt_template = ChatPromptTemplate.from_template(template)
-
-    variables = prompt_template.messages[0].prompt.input_variables
+    variables = parse_template(template)
     inputs = {}
     for variable in variables:
         var_name = variable
@@ -74,24 +133,79 @@ def get_template_names(template_use=False):
     Returns:
         list: A list of prompt templates filtered by the selected topic.
     """
-    topics = PromptTemplate.get_topics(session)
+    topics = load_topics()
     selected_topic = st.sidebar.selectbox(
         "Select Topic", ["All"] + topics
     )  # Add dropdown for selecting topic
-    if selected_topic == "All":
-        templates = PromptTemplate.get_all_templates(session)
-    else:
-        templates = PromptTemplate.get_templates_by_topic(session, selected_topic)
+
+    template_ids = load_template_ids(selected_topic)
+    # Remember the ids, so the selected template can be fetched by primary key
+    st.session_state["template_ids"] = template_ids
 
     if not template_use:
         template_names = ["New Template"]  # Make "New Template" the first option
-        template_names.extend([template.name for template in templates])
+        template_names.extend(template_ids)
     else:
-        template_names = [template.name for template in templates]
+        template_names = list(template_ids)
 
     return template_names
 
 
+def get_selected_template(selected_template_name):
+    """
+    Get the selected template by the id remembered from the template list.
+
+    Args:
+        selected_template_name (str): The name of the selected template.
+
+    Returns:
+        PromptTemplate: The selected prompt template, or None if not found.
+    """
+    template_id = st.session_state["template_ids"].get(selected_template_name)
+    if template_id is None:
+        return None
+    return get_session().get(PromptTemplate, template_id)
+
+
+@st.cache_data(ttl=60)
+def load_topics():
+    """
+    Load the distinct template topics from the database.
+
+    The result is cached across reruns and cleared whenever a template is saved or deleted.
+
+    Returns:
+        list: A list of topics ordered by topic.
+    """
+    with create_session() as db_session:
+        return PromptTemplate.get_topics(db_session)
+
+
+@st.cache_data(ttl=60)
+def load_template_ids(topic):
+    """
+    Load the template names and ids of a topic from the database.
+
+    The result is cached across reruns and cleared whenever a template is saved or deleted.
+
+    Args:
+        topic (str): The topic to filter by, or "All" for all templates.
+
+    Returns:
+        dict: A dictionary with template names as keys and template ids as values, ordered by name.
+    """
+    with create_session() as db_session:
+        return PromptTemplate.get_name_ids(db_session, None if topic == "All" else topic)
+
+
+def clear_template_caches():
+    """
+    Clear the cached topics and template names after the templates were changed.
+    """
+    load_topics.clear()
+    load_template_ids.clear()
+
+
 def main():
     """
     Main function to run the Streamlit app.
@@ -140,17 +254,22 @@ def get_selected_template_name(template_names):
 
 def initialize_session_state():
     """
-    Initialize the session state with empty model names if not already set.
+    Initialize the session state with empty HuggingFace credentials, no chat wrapper
+    and no query result if not already set.
     """
-    if "model_names" not in st.session_state:
-        st.session_state["model_names"] = []
-        
     if 'hf_email' not in st.session_state:
         st.session_state["hf_email"] = ''
         
     if 'hf_pwd' not in st.session_state:
         st.session_state["hf_pwd"] = ''
 
+    if 'chat_wrapper' not in st.session_state:
+        st.session_state["chat_wrapper"] = None
+        st.session_state["chat_wrapper_credentials"] = None
+
+    if 'query_result' not in st.session_state:
+        st.session_state["query_result"] = None
+
 
 def use_template():
     """
@@ -174,7 +293,7 @@ def use_template():
 
     selected_template_name = st.sidebar.selectbox("Template", template_names)
 
-    selected_template = PromptTemplate.get_by_name(session, selected_template_name)
+    selected_template = get_selected_template(selected_template_name)
 
     if selected_template:
         display_template(selected_template)
@@ -184,46 +303,97 @@ def use_template():
         # Display available models in selectbox
         model_name = st.sidebar.selectbox("Select Model", model_names)
 
-        inputs = create_input_fields(selected_template.template)
-       
-        side_col1, side_col2 = st.sidebar.columns(2)
-        use_web_search = side_col1.checkbox( "Use Web Search", selected_template.use_web_search )
+        # The form defers reruns until Submit is clicked
+        with st.form("use_form", clear_on_submit=False):
+            inputs = create_input_fields(selected_template.template)
 
-        keep_chat_on_server = side_col2.checkbox("Keep chat on Server")
+            col1, col2 = st.columns(2)
+            use_web_search = col1.checkbox("Use Web Search", selected_template.use_web_search)
+            keep_chat_on_server = col2.checkbox("Keep chat on Server")
 
-        
-        if st.button("Submit"):
+            submitted = st.form_submit_button("Submit")
+
+        query_result = st.session_state["query_result"]
+        if submitted:
             formatted_message = get_formatted_message(selected_template, inputs)
-            chat_wrapper, query_result = call_llm(
-                model_name, use_web_search, formatted_message
-            )
-                
-            st.text_area(
-                label="Prompt", value=formatted_message, height=500, max_chars=None
-            )                        
-            st.markdown("LLM Response")
-            st.markdown(query_result)
-            conversations = chat_wrapper.chatbot.get_conversation_list()
-
-            for conversation in conversations:                
-                st.markdown(conversation.id + ' ' + conversation.model + ' ' + conversation.title)
-                for message in conversation.history:
-                    st.markdown(message.id + ' ' + message.role)
-
-            if use_web_search:
-                for source in query_result.web_search_sources:
-                    st.markdown(source.title + ": " + source.link)
-
-            if not keep_chat_on_server:
-                chat_wrapper.reset()
-        
-        
+            chat_wrapper, response = None, None
+            if formatted_message is not None:
+                chat_wrapper, response = call_llm(
+                    model_name, use_web_search, formatted_message
+                )
+            if response is not None:
+                display_prompt(formatted_message)
+                # Show the response while it is generated, it is read to the end here, before
+                # the conversation it belongs to may be reset below
+                response_text = st.write_stream(HuggingChatWrapper.stream_tokens(response))
+                query_result = {
+                    "template_name": selected_template.name,
+                    "prompt": formatted_message,
+                    "response": response_text,
+                    # hugchat keeps the sources in a list shared by all messages, keep a copy
+                    "web_search_sources": [
+                        (source.title, source.link) for source in response.web_search_sources
+                    ] if use_web_search else [],
+                    "conversations": chat_wrapper.chatbot.get_conversation_list(),
+                }
+                # Keep the result in the session state, so incidental reruns do not lose it
+                st.session_state["query_result"] = query_result
+                display_query_details(query_result)
+
+                if not keep_chat_on_server:
+                    chat_wrapper.reset()
+
+        elif query_result and query_result["template_name"] == selected_template.name:
+            display_prompt(query_result["prompt"])
+            st.markdown(query_result["response"])
+            display_query_details(query_result)
+
+
         if st.sidebar.button("Delete all Chats on Server"):
-            chat_wrapper = HuggingChatWrapper()
+            chat_wrapper = get_chat_wrapper()
             chat_wrapper.delete_all()
             st.success("All Chats on Server deleted!")
 
 
+def display_prompt(formatted_message):
+    """
+    Display the prompt sent to the LLM and the heading of its response.
+
+    Args:
+        formatted_message (str): The formatted message sent to the LLM.
+    """
+    st.text_area(
+        label="Prompt", value=formatted_message, height=500, max_chars=None
+    )
+    st.markdown("LLM Response")
+
+
+def display_query_details(query_result):
+    """
+    Display the conversations and the web search sources of the last query.
+
+    Args:
+        query_result (dict): The last query result stored in the session state.
+    """
+    # A single markdown element for all conversations and messages
+    blocks = []
+    for conversation in query_result["conversations"]:
+        lines = [f"{conversation.id} {conversation.model} {conversation.title}"]
+        lines.extend(f"- {message.id} {message.role}" for message in conversation.history)
+        blocks.append("\n".join(lines))
+    if blocks:
+        st.markdown("\n\n".join(blocks))
+
+    if query_result["web_search_sources"]:
+        # A single markdown element for all sources instead of one per source
+        st.markdown(
+            "\n".join(
+                f"- [{title}]({link})"
+                for title, link in query_result["web_search_sources"]
+            )
+        )
+
+
 def display_template(selected_template):
     """
     Display the selected template's details.
@@ -241,37 +411,73 @@ def call_llm(model_name, use_web_search, formatted_message):
     """
     Call the LLM with the formatted message.
 
+    The response is generated while it is read, the caller streams it into the page.
+
+    The model list is cached for all sessions of an account, while each wrapper fetches its own
+    models, so a selected model may be missing from the wrapper. The cached list is reloaded then.
+
     Args:
         model_name (str): The name of the model to use.
         use_web_search (bool): Whether to use web search.
         formatted_message (str): The formatted message to send to the LLM.
 
     Returns:
-        tuple: A tuple containing the chat wrapper instance and the query result.
+        tuple: A tuple containing the chat wrapper instance and the query result, which is
+            None if no model is selected or the model is not available.
     """
-    chat_wrapper = HuggingChatWrapper()
-    chat_wrapper.switch_model(model_name)
+    chat_wrapper = get_chat_wrapper()
+    try:
+        chat_wrapper.switch_model(model_name)
+    except ValueError as e:
+        st.error(e)
+        return chat_wrapper, None
+    except KeyError:
+        st.error(f"The model {model_name} is no longer available, select a model and submit again.")
+        load_model_names.clear(st.session_state["hf_email"], st.session_state["hf_pwd"], chat_wrapper)
+        return chat_wrapper, None
     query_result = chat_wrapper.chat(formatted_message, use_web_search)
     return chat_wrapper, query_result
 
 
+def get_chat_wrapper():
+    """
+    Get the chat wrapper of the current browser session.
+
+    Each session has its own wrapper, so its ChatBot, conversations and selected model are not
+    shared with other sessions of the same account. It is kept in the session state across
+    reruns and replaced when the credentials change. The login cookies and the model list are
+    shared by all sessions of an account.
+
+    Returns:
+        HuggingChatWrapper: The chat wrapper instance.
+    """
+    credentials = (st.session_state["hf_email"], st.session_state["hf_pwd"])
+    if st.session_state["chat_wrapper_credentials"] != credentials:
+        st.session_state["chat_wrapper"] = HuggingChatWrapper()
+        st.session_state["chat_wrapper_credentials"] = credentials
+    return st.session_state["chat_wrapper"]
+
+
 def get_formatted_message(selected_template, inputs):
     """
     Format the message based on the selected template and input values.
 
+    Errors of templates that cannot be formatted, e.g. `{a.b}` on a string input, a single
+    brace or a JSON example such as `{"a": 1}`, are shown instead of raised.
+
     Args:
         selected_template (PromptTemplate): The selected prompt template.
         inputs (dict): The dictionary of input values.
 
     Returns:
-        str: The formatted message.
-    """
-    input_values = {}
-    for var_name, var_value in inputs.items():
-        input_values[var_name] = var_value
-    prompt = ChatPromptTemplate.from_template(selected_template.template)
-    formatted_messages = prompt.format_messages(**input_values)
-    formatted_message = formatted_messages[0].content
+        str: The formatted message, or None if the template cannot be formatted.
+    """
+    try:
+        formatted_message = selected_template.template.format_map(SafeDict(inputs))
+    except (ValueError, AttributeError, KeyError, IndexError, TypeError) as e:
+        st.error(f"The template cannot be formatted: {e!r}. Double the braces that are not "
+                 "placeholders, e.g. `{{` and `}}`.")
+        return None
     return formatted_message
 
 
@@ -282,20 +488,36 @@ def get_model_names():
     Returns:
         list: A list of available model names.
     """
-    if st.session_state["model_names"] == []:
-        try:
-            chat_wrapper = HuggingChatWrapper()
-            model_names = chat_wrapper.get_available_models()
-            st.session_state["model_names"].append(model_names)
-            chat_wrapper.reset()
-        except Exception as e:
-            st.error(e)
-    else:
-        model_names = st.session_state["model_names"][0]
+    model_names = []
+    try:
+        model_names = load_model_names(
+            st.session_state["hf_email"], st.session_state["hf_pwd"], get_chat_wrapper()
+        )
+    except Exception as e:
+        st.error(e)
 
     return model_names
 
 
+@st.cache_resource(ttl=3600)
+def load_model_names(hf_email, hf_pwd, _chat_wrapper):
+    """
+    Load the names of the available models.
+
+    The list is shared by all sessions of an account for an hour and must not be modified.
+    The credentials are the cache key, the wrapper of the calling session fetches the list.
+
+    Args:
+        hf_email (str): The HuggingFace e-mail from the session state.
+        hf_pwd (str): The HuggingFace password from the session state.
+        _chat_wrapper (HuggingChatWrapper): The chat wrapper of the session, not hashed.
+
+    Returns:
+        list: A list of available model names.
+    """
+    return _chat_wrapper.get_available_models()
+
+
 def maintain_template(template_names, selected_template_name):
     """
     Maintain the selected template, providing options to update or delete it.
@@ -304,27 +526,29 @@ def maintain_template(template_names, selected_template_name):
         template_names (list): A list of all template names.
         selected_template_name (str): The name of the selected template.
     """
-    selected_template = PromptTemplate.get_by_name(session, selected_template_name)
+    selected_template = get_selected_template(selected_template_name)
     if selected_template:
-        topic, name, purpose, use_web_search, template = get_template_values(
-            selected_template
-        )
+        # The form defers reruns until Save or Delete is clicked
+        with st.form("edit_form", clear_on_submit=False):
+            topic, name, purpose, use_web_search, template = get_template_values(
+                selected_template
+            )
 
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("Save", key="save_button"):
-                update_template(
-                    template_names,
-                    selected_template_name,
-                    selected_template,
-                    topic,
-                    name,
-                    purpose,
-                    use_web_search,
-                    template,
-                )
-        with col2:
-            delete_template(selected_template)
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.form_submit_button("Save"):
+                    update_template(
+                        template_names,
+                        selected_template_name,
+                        selected_template,
+                        topic,
+                        name,
+                        purpose,
+                        use_web_search,
+                        template,
+                    )
+            with col2:
+                delete_template(selected_template)
 
 
 def get_template_values(selected_template):
@@ -382,7 +606,8 @@ def update_template(
             selected_template.purpose = purpose
             selected_template.use_web_search = use_web_search
             selected_template.template = template
-            session.commit()
+            get_session().commit()
+            clear_template_caches()
             st.success("Changes saved successfully!")
 
 
@@ -390,12 +615,15 @@ def delete_template(selected_template):
     """
     Delete the selected template from the database.
 
+    Must be called inside a form, the Delete button is a form submit button.
+
     Args:
         selected_template (PromptTemplate): The selected prompt template to be deleted.
     """
-    if st.button("Delete", key="delete_button") and selected_template:
-        session.delete(selected_template)
-        session.commit()
+    if st.form_submit_button("Delete") and selected_template:
+        get_session().delete(selected_template)
+        get_session().commit()
+        clear_template_caches()
         st.success("Template deleted successfully!")
 
 
@@ -407,14 +635,18 @@ def create_template(template_names):
         template_names (list): A list of existing template names.
     """
     st.empty()
-    name = st.text_input("Name")
-    topic = st.text_input("Topic")
-    purpose = st.text_area("Purpose")
-    use_web_search = st.checkbox("Use Web Search")
-    template = st.text_area(
-        "Template", height=250
-    )  # Make the text area expand vertically
-    if st.button("Save New Template"):
+    # The form defers reruns until the template is saved
+    with st.form("create_form", clear_on_submit=False):
+        name = st.text_input("Name")
+        topic = st.text_input("Topic")
+        purpose = st.text_area("Purpose")
+        use_web_search = st.checkbox("Use Web Search")
+        template = st.text_area(
+            "Template", height=250
+        )  # Make the text area expand vertically
+        submitted = st.form_submit_button("Save New Template")
+
+    if submitted:
         if not topic:
             st.error("Please enter a topic for the template!")
         if not name:
@@ -430,10 +662,15 @@ def create_template(template_names):
                     template=template,
                     use_web_search=use_web_search,
                 )
-                session.add(new_template)
-                session.commit()
+                get_session().add(new_template)
+                get_session().commit()
+                clear_template_caches()
                 st.success("Template saved successfully!")
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        # Return the connection of this run's session to the pool
+        remove_session()
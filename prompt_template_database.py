@@ -9,15 +9,31 @@ Classes:
     PromptTemplate: A SQLAlchemy ORM class for the `prompt_templates` table.
 
 Functions:
-    create_database: Creates the `prompt_templates` table in the database.
-    get_session: Creates and returns a new SQLAlchemy session.
+    set_sqlite_pragmas: Enables WAL journaling and tunes each new SQLite connection.
+    copy_rows: Copies the rows of one `prompt_templates` table into another.
+    finish_migration: Renames the migrated table and creates its indexes.
+    migrate_to_integer_ids: Migrates a table with UUID string ids to integer ids.
+    resume_migration: Finishes a migration to integer ids that was interrupted.
+    init_database: Creates the table on the first run and upgrades tables of older versions.
+    get_engine: Returns the pooled engine, initializing the database on first use.
+    get_session: Returns the thread-local `scoped_session` registry proxying the current session.
+    create_session: Creates a short-lived, request-scoped session.
+    remove_session: Closes the current thread's session at the end of a script run.
+
+Attributes:
+    SessionLocal: A session factory for short-lived, request-scoped sessions.
+
+Nothing connects to the database until one of these functions is called or `SessionLocal`
+is accessed.
 """
-import uuid
-from sqlalchemy import create_engine, Column, String, Text
+import threading
+from sqlalchemy import create_engine, event, inspect, Column, Index, Integer, MetaData, String, Text
 from sqlalchemy.types import Boolean
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import asc
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.schema import CreateTable
+from sqlalchemy import asc, insert, select
 
 # Define the SQLAlchemy base
 Base = declarative_base()
@@ -28,7 +44,7 @@ class PromptTemplate(Base):
     A SQLAlchemy ORM class representing the `prompt_templates` table.
 
     Attributes:
-        id (str): The primary key, a unique identifier for each prompt template.
+        id (int): The primary key, an auto-incremented identifier for each prompt template.
         topic (str): The topic of the prompt template.
         name (str): The name of the prompt template.
         purpose (str): The purpose of the prompt template.
@@ -40,10 +56,16 @@ class PromptTemplate(Base):
         get_topics(session): Retrieves distinct topics from the templates.
         get_all_templates(session): Fetches all templates, ordered by name.
         get_templates_by_topic(session, topic): Fetches templates filtered by topic, ordered by name.
+        get_name_ids(session, topic): Fetches the template names and ids, optionally of one topic, ordered by name.
+        bulk_create(session, rows): Inserts many templates in one statement and commits them.
     """
     __tablename__ = 'prompt_templates'
+    __table_args__ = (
+        Index('ix_pt_topic_name', 'topic', 'name'),
+        Index('ix_pt_name', 'name'),
+    )
 
-    id = Column(String, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     topic = Column(String)
     name = Column(String)
     purpose = Column(String)
@@ -60,7 +82,6 @@ class PromptTemplate(Base):
             template (str): The text content of the prompt template.
             use_web_search (bool): Indicates whether web search is used in the template.
         """
-        self.id = str(uuid.uuid4())
         self.topic = topic
         self.name = name
         self.purpose = purpose
@@ -98,7 +119,7 @@ class PromptTemplate(Base):
         Returns:
             list: A list of distinct topics.
         """
-         return [result[0] for result in session.query(PromptTemplate.topic).distinct().order_by(asc(PromptTemplate.topic))]
+         return list(session.scalars(select(PromptTemplate.topic).distinct().order_by(asc(PromptTemplate.topic))))
         
     @staticmethod 
     def get_all_templates(session):
@@ -128,12 +149,266 @@ class PromptTemplate(Base):
         """
         return session.query(PromptTemplate).filter_by(topic=topic).order_by(asc(PromptTemplate.name)).all()
 
-# Define the database connection
-engine = create_engine('sqlite:///python_development_templates.db')
+    @staticmethod
+    def get_name_ids(session, topic=None):
+        """
+        Fetches only the names and ids of the prompt templates, ordered by name.
+
+        Args:
+            session (Session): The SQLAlchemy session.
+            topic (str): The topic to filter the prompt templates by, or None for all templates.
+
+        Returns:
+            dict: A dictionary with prompt template names as keys and their ids as values.
+        """
+        query = select(PromptTemplate.name, PromptTemplate.id)
+        if topic is not None:
+            query = query.where(PromptTemplate.topic == topic)
+        return {name: template_id for name, template_id in session.execute(query.order_by(asc(PromptTemplate.name)))}
+
+    @staticmethod
+    def bulk_create(session, rows):
+        """
+        Inserts many prompt templates with one executemany INSERT and commits them.
+
+        Use this instead of adding one PromptTemplate per row for imports.
+
+        Args:
+            session (Session): The SQLAlchemy session.
+            rows (list): A list of dictionaries with the keys topic, name, purpose, template
+                and optionally use_web_search.
+        """
+        session.execute(insert(PromptTemplate), [{'use_web_search': False, **row} for row in rows])
+        session.commit()
+
+DATABASE_URL = 'sqlite:///python_development_templates.db'
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Configures each new SQLite connection for concurrent reads and fast commits.
+
+    Args:
+        dbapi_connection (sqlite3.Connection): The new DBAPI connection.
+        connection_record (ConnectionRecord): The pool record of the connection.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA cache_size=-20000')
+    cursor.close()
+
+
+def copy_rows(connection, source_table, target_table):
+    """
+    Copies the rows of one `prompt_templates` table into another, new ids are assigned.
+
+    Args:
+        connection (Connection): The SQLAlchemy connection to copy the rows with.
+        source_table (str): The name of the table to copy the rows from.
+        target_table (str): The name of the table to copy the rows into.
+    """
+    connection.exec_driver_sql(
+        f'INSERT INTO {target_table} (topic, name, purpose, template, use_web_search) '
+        f'SELECT topic, name, purpose, template, use_web_search FROM {source_table} ORDER BY rowid'
+    )
+
+
+def finish_migration(engine):
+    """
+    Renames the copied table with integer ids to `prompt_templates` and creates its indexes.
+
+    Args:
+        engine (Engine): The SQLAlchemy engine of the database to migrate.
+    """
+    table_name = PromptTemplate.__tablename__
+    with engine.begin() as connection:
+        connection.exec_driver_sql(f'ALTER TABLE {table_name}_new RENAME TO {table_name}')
+        for index in PromptTemplate.__table__.indexes:
+            index.create(connection)
+
+
+def migrate_to_integer_ids(engine):
+    """
+    Migrates a `prompt_templates` table with UUID string ids to integer ids.
+
+    The rows are copied into a new table `prompt_templates_new` with an INTEGER primary key,
+    which SQLite stores as the rowid. Only then the old table is dropped and the new one is
+    renamed. pysqlite commits each DDL statement on its own, so the steps are ordered such that
+    an interruption at any point leaves either the complete old table or the complete new
+    table, `init_database` finishes the migration on the next start.
+
+    Args:
+        engine (Engine): The SQLAlchemy engine of the database to migrate.
+    """
+    table_name = PromptTemplate.__tablename__
+    new_table = PromptTemplate.__table__.to_metadata(MetaData(), name=f'{table_name}_new')
+    with engine.begin() as connection:
+        # A copy left by an interrupted run may be incomplete, the old table has all rows
+        connection.exec_driver_sql(f'DROP TABLE IF EXISTS {table_name}_new')
+        # Without the indexes, their names are still taken by the indexes of the old table
+        connection.execute(CreateTable(new_table))
+        copy_rows(connection, table_name, f'{table_name}_new')
+    with engine.begin() as connection:
+        connection.exec_driver_sql(f'DROP TABLE {table_name}')
+    finish_migration(engine)
+
+
+def resume_migration(engine, table_names):
+    """
+    Finishes a migration to integer ids that was interrupted after the old table was dropped.
+
+    Older versions renamed the table with UUID ids to `prompt_templates_uuid` before copying its
+    rows, their leftover table is copied into `prompt_templates` or renamed back, so it is
+    migrated like any other table with UUID ids.
+
+    Args:
+        engine (Engine): The SQLAlchemy engine of the database to migrate.
+        table_names (set): The names of the tables in the database.
+    """
+    table_name = PromptTemplate.__tablename__
+    if f'{table_name}_uuid' in table_names:
+        with engine.begin() as connection:
+            if table_name in table_names:
+                # The new table was created, the copy was rolled back
+                copy_rows(connection, f'{table_name}_uuid', table_name)
+                connection.exec_driver_sql(f'DROP TABLE {table_name}_uuid')
+            else:
+                connection.exec_driver_sql(f'ALTER TABLE {table_name}_uuid RENAME TO {table_name}')
+    elif f'{table_name}_new' in table_names and table_name not in table_names:
+        # The old table is already dropped, the copy is complete
+        finish_migration(engine)
+
+
+def init_database(engine):
+    """
+    Creates the `prompt_templates` table on the first run and upgrades tables of older versions.
+
+    A single inspection decides what to do, so the usual start with an up-to-date table only
+    reads the table and index metadata once and writes nothing. A migration to integer ids that
+    was interrupted is finished first.
+
+    Args:
+        engine (Engine): The SQLAlchemy engine of the database to initialize.
+    """
+    table_name = PromptTemplate.__tablename__
+    inspector = inspect(engine)
+    table_names = set(inspector.get_table_names())
+    if {f'{table_name}_uuid', f'{table_name}_new'} & table_names:
+        resume_migration(engine, table_names)
+        inspector = inspect(engine)
+        table_names = set(inspector.get_table_names())
+    if table_name not in table_names:
+        # First run, the table is created together with its indexes
+        Base.metadata.create_all(engine)
+        return
+
+    columns = {column['name']: column['type'] for column in inspector.get_columns(table_name)}
+    if not isinstance(columns['id'], Integer):
+        # Table with UUID string ids, the migrated table is created together with its indexes
+        migrate_to_integer_ids(engine)
+        return
+
+    # Create the indexes on tables created before they were defined, and recreate the
+    # indexes whose uniqueness changed since
+    existing_indexes = {
+        index['name']: bool(index['unique']) for index in inspector.get_indexes(table_name)
+    }
+    for index in PromptTemplate.__table__.indexes:
+        if index.name in existing_indexes:
+            if existing_indexes[index.name] == bool(index.unique):
+                continue
+            index.drop(engine)
+        index.create(engine)
+
+
+# Guards the creation of the engine and the session registry, so concurrent first calls from
+# several Streamlit sessions initialize or migrate the database only once
+_lock = threading.RLock()
+_engine = None
+_session = None
+
+
+def get_engine():
+    """
+    Returns the engine with a connection pool shared by all sessions of the process.
+
+    The engine is created, and the tables are created or upgraded, on the first call only.
+
+    Returns:
+        Engine: The SQLAlchemy engine of the SQLite database.
+    """
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                engine = create_engine(
+                    DATABASE_URL,
+                    # Streamlit runs the script in several threads, the pool hands
+                    # connections between them
+                    connect_args={'check_same_thread': False},
+                    poolclass=QueuePool,
+                    pool_size=10,
+                    max_overflow=20,
+                    pool_pre_ping=True,
+                    pool_recycle=300,
+                )
+                event.listen(engine, 'connect', set_sqlite_pragmas)
+                init_database(engine)
+                _engine = engine
+    return _engine
 
-# Create tables
-Base.metadata.create_all(engine)
 
-# Create a session
-Session = sessionmaker(bind=engine)
-session = Session()
\ No newline at end of file
+def get_session():
+    """
+    Returns the thread-local session registry, each Streamlit script thread gets its own session.
+
+    Returns:
+        scoped_session: The registry, it proxies the methods of the current thread's session.
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = scoped_session(sessionmaker(bind=get_engine()))
+    return _session
+
+
+def create_session():
+    """
+    Creates a short-lived session, use it as `with create_session() as session:`.
+
+    Returns:
+        Session: A new SQLAlchemy session on the shared engine.
+    """
+    return get_session().session_factory()
+
+
+def remove_session():
+    """
+    Closes the current thread's session and returns its connection to the pool.
+
+    Call it at the end of each script run, a thread that ends without it holds its pooled
+    connection until its session is garbage collected. Does nothing if no session was created.
+    """
+    if _session is not None:
+        _session.remove()
+
+
+def __getattr__(name):
+    """
+    Returns `SessionLocal`, the session factory, creating the engine on first access.
+
+    Args:
+        name (str): The name of the attribute.
+
+    Returns:
+        sessionmaker: The session factory bound to the shared engine.
+
+    Raises:
+        AttributeError: If the module has no attribute with this name.
+    """
+    if name == 'SessionLocal':
+        return get_session().session_factory
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,95 @@
+"""
+Tests of the concurrent chat queries of `HuggingChatWrapper`.
+"""
+import threading
+import time
+
+import streamlit as st
+
+from huggingface_chat import HuggingChatWrapper
+
+DELAY = 0.5
+
+
+class FakeMessage:
+    """
+    A response like hugchat's `Message`, nothing is generated until it is read.
+    """
+
+    def __init__(self, text, calls):
+        self.text = text
+        self.calls = calls
+
+    def wait_until_done(self):
+        time.sleep(DELAY)
+        self.calls.append(threading.current_thread().name)
+        return f"answer to {self.text}"
+
+
+class FakeChatBot:
+    """
+    A ChatBot that takes `DELAY` seconds to generate each response.
+    """
+
+    def __init__(self):
+        # Like hugchat, the ChatBot starts with a conversation
+        self.conversation_list = [object()]
+        self.created = []
+        self.calls = []
+
+    def new_conversation(self, modelIndex=None, switch_to=False):
+        conversation = object()
+        self.conversation_list.append(conversation)
+        self.created.append(conversation)
+        return conversation
+
+    def get_conversation_list(self):
+        return list(self.conversation_list)
+
+    def delete_conversation(self, conversation):
+        assert threading.current_thread() is threading.main_thread()
+        self.conversation_list.pop(self.conversation_list.index(conversation))
+
+    def chat(self, text, web_search=False, conversation=None):
+        assert conversation is not None
+        return FakeMessage(text, self.calls)
+
+
+def make_wrapper():
+    st.session_state["hf_email"] = "user@example.com"
+    st.session_state["hf_pwd"] = "secret"
+    wrapper = HuggingChatWrapper()
+    wrapper.chatbot = FakeChatBot()
+    return wrapper
+
+
+def test_chat_many_runs_the_queries_concurrently():
+    wrapper = make_wrapper()
+    queries = [(f"query {index}", False) for index in range(5)]
+
+    start = time.perf_counter()
+    responses = wrapper.chat_many(queries)
+    elapsed = time.perf_counter() - start
+
+    assert responses == [f"answer to query {index}" for index in range(5)]
+    assert elapsed < 2 * DELAY
+    assert threading.main_thread().name not in wrapper.chatbot.calls
+
+
+def test_chat_many_uses_one_conversation_per_query():
+    wrapper = make_wrapper()
+
+    wrapper.chat_many([("first", False), ("second", True)])
+
+    created = wrapper.chatbot.created
+    assert len(created) == 2
+    assert created[0] is not created[1]
+
+
+def test_chat_many_deletes_the_conversations_of_the_queries():
+    wrapper = make_wrapper()
+    initial_conversations = wrapper.chatbot.get_conversation_list()
+
+    wrapper.chat_many([("first", False), ("second", True)])
+
+    assert wrapper.chatbot.get_conversation_list() == initial_conversations
@@ -0,0 +1,38 @@
+"""
+Tests of the template formatting of `prompt_template_app`.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+import prompt_template_app
+from prompt_template_app import get_formatted_message, parse_template
+
+
+@pytest.fixture
+def errors(monkeypatch):
+    shown = []
+    monkeypatch.setattr(prompt_template_app.st, "error", shown.append)
+    return shown
+
+
+def format_template(template, inputs):
+    return get_formatted_message(SimpleNamespace(template=template), inputs)
+
+
+def test_get_formatted_message_fills_the_inputs_and_keeps_missing_placeholders(errors):
+    assert format_template("{x} and {y:>3}", {"x": "a"}) == "a and {y}"
+    assert errors == []
+
+
+@pytest.mark.parametrize("template, variables", [
+    ("Show {a.b}", ("a",)),
+    ("Use } here {x}", ()),
+    ('Return JSON like {"a": 1}', ()),
+])
+def test_get_formatted_message_shows_an_error_for_templates_it_cannot_format(
+    errors, template, variables
+):
+    assert parse_template(template) == variables
+    assert format_template(template, dict.fromkeys(variables, "value")) is None
+    assert len(errors) == 1
@@ -0,0 +1,82 @@
+"""
+Tests of the prompt_template_database module.
+"""
+import pytest
+from sqlalchemy import create_engine, event, inspect, Integer
+
+from prompt_template_database import PromptTemplate, init_database, migrate_to_integer_ids
+
+TEMPLATE_NAMES = ["alpha", "beta", "gamma"]
+
+
+def create_uuid_table(engine, table_name="prompt_templates"):
+    """Creates a table of the versions with UUID string ids and fills it."""
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            f"CREATE TABLE {table_name} (id VARCHAR NOT NULL, topic VARCHAR, name VARCHAR, "
+            "purpose VARCHAR, template TEXT, use_web_search BOOLEAN, PRIMARY KEY (id))"
+        )
+        for number, name in enumerate(TEMPLATE_NAMES):
+            connection.exec_driver_sql(
+                f"INSERT INTO {table_name} VALUES (?, 'topic', ?, 'purpose', 'template', 0)",
+                (f"uuid-{number}", name),
+            )
+
+
+def assert_migrated(engine):
+    """Asserts that the templates are in one table with integer ids and all indexes."""
+    inspector = inspect(engine)
+    assert inspector.get_table_names() == ["prompt_templates"]
+    columns = {column["name"]: column["type"] for column in inspector.get_columns("prompt_templates")}
+    assert isinstance(columns["id"], Integer)
+    assert {index["name"] for index in inspector.get_indexes("prompt_templates")} == {
+        index.name for index in PromptTemplate.__table__.indexes
+    }
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql("SELECT id, name FROM prompt_templates ORDER BY id").all()
+    assert rows == [(number, name) for number, name in enumerate(TEMPLATE_NAMES, start=1)]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'templates.db'}")
+    yield engine
+    engine.dispose()
+
+
+def test_migrate_to_integer_ids(engine):
+    create_uuid_table(engine)
+    init_database(engine)
+    assert_migrated(engine)
+
+
+@pytest.mark.parametrize("failing_statement", [
+    "INSERT INTO prompt_templates_new",
+    "DROP TABLE prompt_templates",
+    "ALTER TABLE prompt_templates_new RENAME",
+    "CREATE INDEX",
+])
+def test_interrupted_migration_is_finished_on_the_next_start(engine, failing_statement):
+    create_uuid_table(engine)
+
+    def fail(connection, cursor, statement, parameters, context, executemany):
+        if statement.startswith(failing_statement):
+            raise RuntimeError("interrupted")
+
+    event.listen(engine, "before_cursor_execute", fail)
+    with pytest.raises(RuntimeError, match="interrupted"):
+        migrate_to_integer_ids(engine)
+    event.remove(engine, "before_cursor_execute", fail)
+
+    init_database(engine)
+    assert_migrated(engine)
+
+
+@pytest.mark.parametrize("with_new_table", [False, True])
+def test_leftover_uuid_table_of_older_versions_is_migrated(engine, with_new_table):
+    # Older versions renamed the table before creating the new one and copying the rows
+    create_uuid_table(engine, "prompt_templates_uuid")
+    if with_new_table:
+        PromptTemplate.__table__.create(engine)
+    init_database(engine)
+    assert_migrated(engine)
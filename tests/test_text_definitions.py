@@ -0,0 +1,44 @@
+"""
+Tests of the batched prompting helpers of `text_definitions`.
+"""
+import pytest
+
+from text_definitions import batch_prompting_principles, parse_batched_response, prompting_principles
+
+
+def test_batch_prompting_principles_includes_the_principles_once():
+    prompt = batch_prompting_principles(["first", "second"])
+
+    assert prompt.count(prompting_principles) == 1
+    assert prompt.endswith("[1] first\n[2] second")
+
+
+def test_parse_batched_response_splits_tags_on_their_own_lines():
+    assert parse_batched_response("[1] a\nmore\n[2] b", 2) == ["a\nmore", "b"]
+
+
+def test_parse_batched_response_skips_a_preamble_and_splits_inline_tags():
+    assert parse_batched_response("Sure!\n[1] a [2] b", 2) == ["a", "b"]
+
+
+def test_parse_batched_response_keeps_other_bracketed_numbers_in_the_answer():
+    assert parse_batched_response("[1] see [3] below [2] b [3] c", 3) == ["see [3] below", "b", "c"]
+
+
+def test_parse_batched_response_warns_about_missing_answers():
+    with pytest.warns(RuntimeWarning, match="1 of 2"):
+        answers = parse_batched_response("[1] a", 2)
+
+    assert answers == ["a", ""]
+
+
+def test_parse_batched_response_ignores_tags_mentioned_in_a_preamble():
+    text = "Here are the answers to [1] and [2]:\n[1] alpha\n[2] beta"
+
+    assert parse_batched_response(text, 2) == ["alpha", "beta"]
+
+
+def test_parse_batched_response_ignores_the_next_tag_mentioned_in_an_answer():
+    text = "[1] See step [2] above\n[2] beta\n[3] gamma"
+
+    assert parse_batched_response(text, 3) == ["See step [2] above", "beta", "gamma"]
@@ -1,78 +1,144 @@
-prompting_principles = '''
+"""
+Text Definitions
+================
+
+This module defines the prompting principles displayed by the app.
+
+The principles are split into one constant per section, so code that needs a single tactic can
+import it without the whole text. The constants are interned at import.
+
+For exact-match caches of prompts that start with the principles, the SHA-256 state after hashing
+the principles is kept, so a cache key only needs to hash the variable tail of a prompt.
+
+`prompting_principles_bytes` is the UTF-8 encoding of the principles, HTTP clients can send it
+as is instead of encoding the principles per request.
+
+`render_steps` fills the text of the steps prompt in `STEPS_PROMPT_TEMPLATE` by concatenation,
+without parsing the template on every call.
+
+To apply the principles to several queries, `batch_prompting_principles` builds one prompt with a
+single copy of the principles and indexed queries, and `parse_batched_response` splits the
+indexed answers again.
+
+If `tiktoken` is installed, the token IDs of the principles for the `cl100k_base` and
+`o200k_base` encodings are available as `prompting_principles_tokens_cl100k` and
+`prompting_principles_tokens_o200k`, so a request only needs to tokenize the user query.
+They are built on first access (PEP 562 module `__getattr__`) and then stored as module
+attributes, so `tiktoken` is only imported if they are used. Without it or offline they are None.
+
+`prompting_principles_embedding` is the embedding vector of the principles saved by
+`build_embedding.py`, memory-mapped read-only on first access so forked workers share it. It is
+None if the vector has not been built for the current text or `numpy` is not installed.
+"""
+import hashlib
+import os
+import re
+import sys
+import textwrap
+import warnings
+
+
+BATCH_INSTRUCTION = (
+    "Answer each of the following independently, prefixing each answer with its [index] tag."
+)
+BATCHED_ANSWER_TAG_PATTERN = re.compile(r"\[(\d+)\]")
+BATCHED_ANSWER_LINE_TAG_PATTERN = re.compile(r"^[ \t]*\[(\d+)\]", re.MULTILINE)
+
+
+def _section(text):
+    """
+    Dedents and strips a section once at import and interns the result.
+
+    Args:
+        text (str): The indented section text.
+
+    Returns:
+        str: The interned section text.
+    """
+    return sys.intern(textwrap.dedent(text).strip())
+
+
+PRINCIPLES = _section('''
                 ### Prompting Principles
 
                 #### Write clear and specific instructions
                 #### Give the model time to “think”
 
                 ### Tactics
+                ''')
 
+TACTIC_DELIMITERS = _section('''
                 #### Use delimiters to clearly indicate distinct parts of the input
 
                 Delimiters can be anything like: ``, """, < >, <tag> </tag>, :
-                
+                ''')
+
+TACTIC_STRUCTURED_OUTPUT = _section('''
                 #### Ask for a structured output
-                
+
                 Structured output could be JSON, plantUML or HTML
-                
+                ''')
+
+TACTIC_CHECK_CONDITIONS = _section('''
                 #### Ask the model to check whether conditions are satisfied
-                
+
                 prompt = f"""
-                You will be provided with text delimited by triple quotes. 
-                If it contains a sequence of instructions, \ 
-                re-write those instructions in the following format:
+                You will be provided with text delimited by triple quotes.
+                If it contains a sequence of instructions, re-write those instructions in the following format:
 
                 Step 1 - ...
                 Step 2 - …
                 …
                 Step N - …
 
-                If the text does not contain a sequence of instructions, \ 
-                then simply write \"No steps provided.\"
+                If the text does not contain a sequence of instructions, then simply write "No steps provided."
+                ''')
 
+TACTIC_FEW_SHOT = _section('''
                 #### "Few-shot" prompting
-                
+
                 prompt = f"""
                 Your task is to answer in a consistent style.
 
                 <child>: Teach me about patience.
 
-                <grandparent>: The river that carves the deepest \ 
-                valley flows from a modest spring; the \ 
-                grandest symphony originates from a single note; \ 
-                the most intricate tapestry begins with a solitary thread.
+                <grandparent>: The river that carves the deepest valley flows from a modest spring; the grandest symphony originates from a single note; the most intricate tapestry begins with a solitary thread.
 
                 <child>: Teach me about resilience.
                 """
                 response = get_completion(prompt)
                 print(response)
-                
-                ####  Specify the steps required to complete a task
-                
-                f"""
-                Perform the following actions: 
-                1 - Summarize the following text delimited by triple \
-                backticks with 1 sentence.
+                ''')
+
+STEPS_PROMPT_TEMPLATE = _section('''
+                Perform the following actions:
+                1 - Summarize the following text delimited by triple backticks with 1 sentence.
                 2 - Translate the summary into French.
                 3 - List each name in the French summary.
-                4 - Output a json object that contains the following \
-                keys: french_summary, num_names.
+                4 - Output a json object that contains the following keys: french_summary, num_names.
 
                 Separate your answers with line breaks.
 
                 Text:
                 ```{text}```
-                """
+                ''')
+
+TACTIC_STEPS = sys.intern(
+    f'####  Specify the steps required to complete a task\n\nf"""\n{STEPS_PROMPT_TEMPLATE}\n"""'
+)
+
+# The steps prompt split around its only placeholder, so filling it is a concatenation
+_STEPS_HEAD, _STEPS_TAIL = STEPS_PROMPT_TEMPLATE.split("{text}")
+
+TACTIC_WORK_OUT_OWN = _section('''
                 #### Instruct the model to work out its own solution before rushing to a conclusion
-                
+
                 f"""
-                Your task is to determine if the student's solution \
-                is correct or not.
+                Your task is to determine if the student's solution is correct or not.
                 To solve the problem do the following:
-                - First, work out your own solution to the problem including the final total. 
-                - Then compare your solution to the student's solution \ 
-                and evaluate if the student's solution is correct or not. 
-                Don't decide if the student's solution is correct until 
-                you have done the problem yourself.
+                - First, work out your own solution to the problem including the final total.
+                - Then compare your solution to the student's solution and evaluate if the student's solution is correct or not.
+                Don't decide if the student's solution is correct until you have done the problem yourself.
 
                 Use the following format:
                 Question:
@@ -87,8 +153,7 @@ prompting_principles = '''
                 ```
                 steps to work out the solution and your solution here
                 ```
-                Is the student's solution the same as actual solution \
-                just calculated:
+                Is the student's solution the same as actual solution just calculated:
                 ```
                 yes or no
                 ```
@@ -99,16 +164,12 @@ prompting_principles = '''
 
                 Question:
                 ```
-                I'm building a solar power installation and I need help \
-                working out the financials. 
+                I'm building a solar power installation and I need help working out the financials.
                 - Land costs $100 / square foot
                 - I can buy solar panels for $250 / square foot
-                - I negotiated a contract for maintenance that will cost \
-                me a flat $100k per year, and an additional $10 / square \
-                foot
-                What is the total cost for the first year of operations \
-                as a function of the number of square feet.
-                ``` 
+                - I negotiated a contract for maintenance that will cost me a flat $100k per year, and an additional $10 / square foot
+                What is the total cost for the first year of operations as a function of the number of square feet.
+                ```
                 Student's solution:
                 ```
                 Let x be the size of the installation in square feet.
@@ -120,4 +181,207 @@ prompting_principles = '''
                 ```
                 Actual solution:
                 """
-                '''
\ No newline at end of file
+                ''')
+
+PROMPTING_SECTIONS = (
+    PRINCIPLES,
+    TACTIC_DELIMITERS,
+    TACTIC_STRUCTURED_OUTPUT,
+    TACTIC_CHECK_CONDITIONS,
+    TACTIC_FEW_SHOT,
+    TACTIC_STEPS,
+    TACTIC_WORK_OUT_OWN,
+)
+
+prompting_principles = "\n\n".join(PROMPTING_SECTIONS)
+
+# The principles encoded once as UTF-8
+prompting_principles_bytes = prompting_principles.encode("utf-8")
+
+# SHA-256 of the principles, and the hash state after them to continue with a user query
+prompting_principles_digest = hashlib.sha256(prompting_principles_bytes).digest()
+prompting_principles_hasher = hashlib.sha256(prompting_principles_bytes)
+
+# Builders of the attributes created on first access
+_LAZY_ATTRIBUTES = {
+    # Token IDs of the principles, None without tiktoken
+    "prompting_principles_tokens_cl100k": lambda: _encode_principles("cl100k_base"),
+    "prompting_principles_tokens_o200k": lambda: _encode_principles("o200k_base"),
+    # Embedding vector of the principles, None if not built or without numpy
+    "prompting_principles_embedding": lambda: _load_embedding(),
+}
+
+
+def _encode_principles(encoding_name):
+    """
+    Returns the token IDs of the principles for a tiktoken encoding.
+
+    tiktoken is imported here, so importing this module does not load it.
+
+    Args:
+        encoding_name (str): The name of the tiktoken encoding.
+
+    Returns:
+        tuple: The token IDs, or None if tiktoken is not installed or the encoding cannot be
+            downloaded.
+    """
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding(encoding_name)
+    except (ImportError, OSError):
+        # OSError includes the requests ConnectionError raised offline
+        return None
+    return tuple(encoding.encode(prompting_principles))
+
+
+def embedding_path():
+    """
+    Returns the path of the embedding vector of the current principles.
+
+    Returns:
+        str: The path of the `.npy` file next to this module.
+    """
+    digest = prompting_principles_digest.hex()[:16]
+    directory = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(directory, f"prompting_principles-{digest}.npy")
+
+
+def _load_embedding():
+    """
+    Memory-maps the embedding vector of the principles read-only.
+
+    Returns:
+        numpy.ndarray: The vector, or None if it has not been built or numpy is not installed.
+    """
+    path = embedding_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+    return np.load(path, mmap_mode="r")
+
+
+def __getattr__(name):
+    """
+    Builds a lazy module attribute on first access and stores it in the module.
+
+    Two threads reading it at the same time may both build it, the results are equal.
+
+    Args:
+        name (str): The name of the attribute.
+
+    Returns:
+        object: The value of the attribute.
+
+    Raises:
+        AttributeError: If the module has no attribute with this name.
+    """
+    try:
+        build = _LAZY_ATTRIBUTES[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = globals()[name] = build()
+    return value
+
+
+def prompting_principles_cache_key(user_query):
+    """
+    Returns the cache key of a prompt made of the principles followed by a user query.
+
+    Only the query is hashed, the stored hash state of the principles is copied.
+
+    Args:
+        user_query (str): The user query appended to the principles.
+
+    Returns:
+        str: The hexadecimal SHA-256 digest of the principles and the query.
+    """
+    hasher = prompting_principles_hasher.copy()
+    hasher.update(user_query.encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def batch_prompting_principles(queries):
+    """
+    Returns one prompt that applies the principles to several queries.
+
+    The principles are included once, followed by an instruction and the queries tagged
+    `[1]` to `[N]`, so their tokens are paid once per batch instead of once per query.
+
+    Args:
+        queries (list): The user queries.
+
+    Returns:
+        str: The batched prompt.
+    """
+    body = "\n".join(f"[{index}] {query}" for index, query in enumerate(queries, 1))
+    return f"{prompting_principles}\n\n{BATCH_INSTRUCTION}\n{body}"
+
+
+def _find_answer_tags(pattern, text, n):
+    """
+    Returns the bounds of the tags `[1]` to `[N]` that a pattern finds in ascending order.
+
+    A tag starts the next answer only if it is the next expected index, so other bracketed
+    numbers in an answer stay part of it.
+
+    Args:
+        pattern (re.Pattern): The pattern of a tag, its group is the index.
+        text (str): The response with answers tagged `[1]` to `[N]`.
+        n (int): The number of queries in the batch.
+
+    Returns:
+        list: The start and end offsets of the tags found.
+    """
+    bounds = []
+    for match in pattern.finditer(text):
+        if len(bounds) < n and int(match.group(1)) == len(bounds) + 1:
+            bounds.append((match.start(), match.end()))
+    return bounds
+
+
+def parse_batched_response(text, n):
+    """
+    Splits the response to a batched prompt into the answers of its queries.
+
+    The tags `[1]` to `[N]` are looked for at the start of a line first, so tags mentioned in a
+    preamble or in an answer are not taken for answers. Only if fewer than `n` are found there,
+    the tags are looked for anywhere in the text, also inline.
+
+    Args:
+        text (str): The response with answers tagged `[1]` to `[N]`.
+        n (int): The number of queries in the batch.
+
+    Returns:
+        list: The answers in query order, an empty string for each answer that is missing.
+
+    Warns:
+        RuntimeWarning: If fewer than `n` answers are found.
+    """
+    bounds = _find_answer_tags(BATCHED_ANSWER_LINE_TAG_PATTERN, text, n)
+    if len(bounds) < n:
+        bounds = max(bounds, _find_answer_tags(BATCHED_ANSWER_TAG_PATTERN, text, n), key=len)
+    ends = [start for start, _ in bounds[1:]] + [len(text)]
+    answers = [text[begin:end].strip() for (_, begin), end in zip(bounds, ends)]
+    if len(answers) < n:
+        warnings.warn(
+            f"Found {len(answers)} of {n} answers in the batched response.",
+            RuntimeWarning,
+            stacklevel=2,
+        )
+    return answers + [""] * (n - len(answers))
+
+
+def render_steps(text):
+    """
+    Returns the steps prompt for a text.
+
+    Args:
+        text (str): The text to put between the triple backticks.
+
+    Returns:
+        str: The prompt asking for the steps on the text.
+    """
+    return _STEPS_HEAD + text + _STEPS_TAIL